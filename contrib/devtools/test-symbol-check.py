@@ -5,14 +5,20 @@
 '''
 Test script for symbol-check.py
 '''
+from concurrent.futures import ThreadPoolExecutor
+import functools
 import os
 import subprocess
-from typing import List
+import sys
+from typing import List, Tuple
 import unittest
 
 from utils import determine_wellknown_cmd
 
-def call_symbol_check(cc: List[str], source, executable, options):
+def call_symbol_check(cc: List[str], cases: List[Tuple[str, str, List[str]]]) -> List[Tuple[int, str]]:
+    # Compile every (source, executable, options) case in parallel, then check
+    # all resulting executables with a single symbol-check.py invocation.
+    #
     # This should behave the same as AC_TRY_LINK, so arrange well-known flags
     # in the same order as autoconf would.
     #
@@ -22,30 +28,68 @@ def call_symbol_check(cc: List[str], source, executable, options):
     for var in ['CFLAGS', 'CPPFLAGS', 'LDFLAGS']:
         env_flags += filter(None, os.environ.get(var, '').split(' '))
 
-    subprocess.run([*cc,source,'-o',executable] + env_flags + options, check=True)
-    p = subprocess.run(['./contrib/devtools/symbol-check.py',executable], stdout=subprocess.PIPE, universal_newlines=True)
-    os.remove(source)
-    os.remove(executable)
-    return (p.returncode, p.stdout.rstrip())
-
-def get_machine(cc: List[str]):
-    p = subprocess.run([*cc,'-dumpmachine'], stdout=subprocess.PIPE, universal_newlines=True)
-    return p.stdout.rstrip()
+    def compile_case(case):
+        source, executable, options = case
+        # Warnings are not of interest, but show the diagnostics if the compile fails
+        p = subprocess.run([*cc,source,'-o',executable] + env_flags + options, stderr=subprocess.PIPE, universal_newlines=True, close_fds=False)
+        if p.returncode != 0:
+            raise AssertionError(f'compiling {source} failed with exit code {p.returncode}:\n{p.stderr}')
+
+    with ThreadPoolExecutor(max_workers=len(cases)) as pool:
+        list(pool.map(compile_case, cases))
+
+    executables = [executable for (_, executable, _) in cases]
+    p = subprocess.run(['./contrib/devtools/symbol-check.py', *executables], stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True, close_fds=False)
+    for (source, executable, _) in cases:
+        os.remove(source)
+        os.remove(executable)
+
+    # A crash part way through would otherwise leave the executables that
+    # were never reached looking like they passed.
+    sys.stderr.write(p.stderr)
+    if 'Traceback (most recent call last)' in p.stderr:
+        raise AssertionError(f'symbol-check.py crashed:\n{p.stderr}')
+
+    # symbol-check.py handles its arguments in order, and finishes the report
+    # for every failing executable with an "<executable>: failed ..." line (or
+    # "cannot open" / "unknown executable format"). Passing executables print
+    # nothing.
+    results = {executable: (0, '') for executable in executables}
+    pending: List[str] = []
+    for line in p.stdout.splitlines():
+        pending.append(line)
+        name, _, status = line.partition(': ')
+        if name in results and (status.startswith('failed') or status in ('cannot open', 'unknown executable format')):
+            for pending_line in pending:
+                pending_name = pending_line.partition(': ')[0]
+                if pending_name in results and pending_name != name:
+                    raise AssertionError(f'symbol-check.py output for {pending_name} is not terminated by a failure line:\n{p.stdout}')
+            results[name] = (1, '\n'.join(pending))
+            pending = []
+    if pending:
+        raise AssertionError(f'symbol-check.py output could not be attributed to an executable:\n{p.stdout}')
+    expected_returncode = 1 if any(returncode for (returncode, _) in results.values()) else 0
+    if p.returncode != expected_returncode:
+        raise AssertionError(f'symbol-check.py exited with {p.returncode}, expected {expected_returncode}:\n{p.stdout}')
+    return [results[executable] for executable in executables]
+
+@functools.lru_cache(maxsize=None)
+def get_machine(cc: Tuple[str, ...]):
+    p = subprocess.run([*cc,'-dumpmachine'], stdout=subprocess.PIPE, close_fds=False)
+    return p.stdout.rstrip().decode('ascii')
 
 class TestSymbolChecks(unittest.TestCase):
     def test_ELF(self):
-        source = 'test1.c'
-        executable = 'test1'
         cc = determine_wellknown_cmd('CC', 'gcc')
 
         # there's no way to do this test for RISC-V at the moment; we build for
         # RISC-V in a glibc 2.27 envinonment and we allow all symbols from 2.27.
-        if 'riscv' in get_machine(cc):
+        if 'riscv' in get_machine(tuple(cc)):
             self.skipTest("test not available for RISC-V")
 
         # nextup was introduced in GLIBC 2.24, so is newer than our supported
         # glibc (2.18), and available in our release build environment (2.24).
-        with open(source, 'w', encoding="utf8") as f:
+        with open('test1.c', 'w', encoding="utf8") as f:
             f.write('''
                 #define _GNU_SOURCE
                 #include <math.h>
@@ -59,15 +103,9 @@ class TestSymbolChecks(unittest.TestCase):
                 }
         ''')
 
-        self.assertEqual(call_symbol_check(cc, source, executable, ['-lm']),
-                (1, executable + ': symbol nextup from unsupported version GLIBC_2.24(3)\n' +
-                    executable + ': failed IMPORTED_SYMBOLS'))
-
         # -lutil is part of the libc6 package so a safe bet that it's installed
         # it's also out of context enough that it's unlikely to ever become a real dependency
-        source = 'test2.c'
-        executable = 'test2'
-        with open(source, 'w', encoding="utf8") as f:
+        with open('test2.c', 'w', encoding="utf8") as f:
             f.write('''
                 #include <utmp.h>
 
@@ -78,14 +116,8 @@ class TestSymbolChecks(unittest.TestCase):
                 }
         ''')
 
-        self.assertEqual(call_symbol_check(cc, source, executable, ['-lutil']),
-                (1, executable + ': libutil.so.1 is not in ALLOWED_LIBRARIES!\n' +
-                    executable + ': failed LIBRARY_DEPENDENCIES'))
-
         # finally, check a simple conforming binary
-        source = 'test3.c'
-        executable = 'test3'
-        with open(source, 'w', encoding="utf8") as f:
+        with open('test3.c', 'w', encoding="utf8") as f:
             f.write('''
                 #include <stdio.h>
 
@@ -96,15 +128,22 @@ class TestSymbolChecks(unittest.TestCase):
                 }
         ''')
 
-        self.assertEqual(call_symbol_check(cc, source, executable, []),
-                (0, ''))
+        self.assertEqual(call_symbol_check(cc, [
+                ('test1.c', 'test1', ['-lm']),
+                ('test2.c', 'test2', ['-lutil']),
+                ('test3.c', 'test3', []),
+            ]), [
+                (1, 'test1: symbol nextup from unsupported version GLIBC_2.24(3)\n' +
+                    'test1: failed IMPORTED_SYMBOLS'),
+                (1, 'test2: libutil.so.1 is not in ALLOWED_LIBRARIES!\n' +
+                    'test2: failed LIBRARY_DEPENDENCIES'),
+                (0, ''),
+            ])
 
     def test_MACHO(self):
-        source = 'test1.c'
-        executable = 'test1'
         cc = determine_wellknown_cmd('CC', 'clang')
 
-        with open(source, 'w', encoding="utf8") as f:
+        with open('test1.c', 'w', encoding="utf8") as f:
             f.write('''
                 #include <expat.h>
 
@@ -116,13 +155,7 @@ class TestSymbolChecks(unittest.TestCase):
 
         ''')
 
-        self.assertEqual(call_symbol_check(cc, source, executable, ['-lexpat', '-Wl,-platform_version','-Wl,macos', '-Wl,11.4', '-Wl,11.4']),
-            (1, 'libexpat.1.dylib is not in ALLOWED_LIBRARIES!\n' +
-                f'{executable}: failed DYNAMIC_LIBRARIES MIN_OS SDK'))
-
-        source = 'test2.c'
-        executable = 'test2'
-        with open(source, 'w', encoding="utf8") as f:
+        with open('test2.c', 'w', encoding="utf8") as f:
             f.write('''
                 #include <CoreGraphics/CoreGraphics.h>
 
@@ -133,12 +166,7 @@ class TestSymbolChecks(unittest.TestCase):
                 }
         ''')
 
-        self.assertEqual(call_symbol_check(cc, source, executable, ['-framework', 'CoreGraphics', '-Wl,-platform_version','-Wl,macos', '-Wl,11.4', '-Wl,11.4']),
-                (1, f'{executable}: failed MIN_OS SDK'))
-
-        source = 'test3.c'
-        executable = 'test3'
-        with open(source, 'w', encoding="utf8") as f:
+        with open('test3.c', 'w', encoding="utf8") as f:
             f.write('''
                 int main()
                 {
@@ -146,15 +174,21 @@ class TestSymbolChecks(unittest.TestCase):
                 }
         ''')
 
-        self.assertEqual(call_symbol_check(cc, source, executable, ['-Wl,-platform_version','-Wl,macos', '-Wl,10.15', '-Wl,11.4']),
-                (1, f'{executable}: failed SDK'))
+        self.assertEqual(call_symbol_check(cc, [
+                ('test1.c', 'test1', ['-lexpat', '-Wl,-platform_version','-Wl,macos', '-Wl,11.4', '-Wl,11.4']),
+                ('test2.c', 'test2', ['-framework', 'CoreGraphics', '-Wl,-platform_version','-Wl,macos', '-Wl,11.4', '-Wl,11.4']),
+                ('test3.c', 'test3', ['-Wl,-platform_version','-Wl,macos', '-Wl,10.15', '-Wl,11.4']),
+            ]), [
+                (1, 'libexpat.1.dylib is not in ALLOWED_LIBRARIES!\n' +
+                    'test1: failed DYNAMIC_LIBRARIES MIN_OS SDK'),
+                (1, 'test2: failed MIN_OS SDK'),
+                (1, 'test3: failed SDK'),
+            ])
 
     def test_PE(self):
-        source = 'test1.c'
-        executable = 'test1.exe'
         cc = determine_wellknown_cmd('CC', 'x86_64-w64-mingw32-gcc')
 
-        with open(source, 'w', encoding="utf8") as f:
+        with open('test1.c', 'w', encoding="utf8") as f:
             f.write('''
                 #include <pdh.h>
 
@@ -165,14 +199,7 @@ class TestSymbolChecks(unittest.TestCase):
                 }
         ''')
 
-        self.assertEqual(call_symbol_check(cc, source, executable, ['-lpdh', '-Wl,--major-subsystem-version', '-Wl,6', '-Wl,--minor-subsystem-version', '-Wl,1']),
-            (1, 'pdh.dll is not in ALLOWED_LIBRARIES!\n' +
-                 executable + ': failed DYNAMIC_LIBRARIES'))
-
-        source = 'test2.c'
-        executable = 'test2.exe'
-
-        with open(source, 'w', encoding="utf8") as f:
+        with open('test2.c', 'w', encoding="utf8") as f:
             f.write('''
                 int main()
                 {
@@ -180,12 +207,7 @@ class TestSymbolChecks(unittest.TestCase):
                 }
         ''')
 
-        self.assertEqual(call_symbol_check(cc, source, executable, ['-Wl,--major-subsystem-version', '-Wl,9', '-Wl,--minor-subsystem-version', '-Wl,9']),
-            (1, executable + ': failed SUBSYSTEM_VERSION'))
-
-        source = 'test3.c'
-        executable = 'test3.exe'
-        with open(source, 'w', encoding="utf8") as f:
+        with open('test3.c', 'w', encoding="utf8") as f:
             f.write('''
                 #include <windows.h>
 
@@ -196,8 +218,16 @@ class TestSymbolChecks(unittest.TestCase):
                 }
         ''')
 
-        self.assertEqual(call_symbol_check(cc, source, executable, ['-lole32', '-Wl,--major-subsystem-version', '-Wl,6', '-Wl,--minor-subsystem-version', '-Wl,1']),
-                (0, ''))
+        self.assertEqual(call_symbol_check(cc, [
+                ('test1.c', 'test1.exe', ['-lpdh', '-Wl,--major-subsystem-version', '-Wl,6', '-Wl,--minor-subsystem-version', '-Wl,1']),
+                ('test2.c', 'test2.exe', ['-Wl,--major-subsystem-version', '-Wl,9', '-Wl,--minor-subsystem-version', '-Wl,9']),
+                ('test3.c', 'test3.exe', ['-lole32', '-Wl,--major-subsystem-version', '-Wl,6', '-Wl,--minor-subsystem-version', '-Wl,1']),
+            ]), [
+                (1, 'pdh.dll is not in ALLOWED_LIBRARIES!\n' +
+                    'test1.exe: failed DYNAMIC_LIBRARIES'),
+                (1, 'test2.exe: failed SUBSYSTEM_VERSION'),
+                (0, ''),
+            ])
 
 
 if __name__ == '__main__':
@@ -42,24 +42,28 @@ class VersionBitsWarningTest(BitcoinTestFramework):
 
     def send_blocks_with_version(self, peer, numblocks, version):
         """Send numblocks blocks to peer with version set"""
-        tip = self.nodes[0].getbestblockhash()
-        height = self.nodes[0].getblockcount()
-        block_time = self.nodes[0].getblockheader(tip)["time"] + 1
-        tip = int(tip, 16)
+        chain_info = self.nodes[0].getblockchaininfo()
+        tip = int(chain_info["bestblockhash"], 16)
+        height = chain_info["blocks"]
+        block_time = chain_info["time"] + 1
 
+        blocks = []
         for _ in range(numblocks):
+            # Every block gets its own coinbase: the blocks are only serialized
+            # once they are all sent below, and the subsidy depends on height.
             block = create_block(tip, create_coinbase(height + 1), block_time, version=version)
             block.solve()
-            peer.send_message(msg_block(block))
+            blocks.append(msg_block(block))
             block_time += 1
             height += 1
             tip = block.sha256
+        peer.send_messages(blocks)
         peer.sync_with_ping()
 
     def versionbits_in_alert_file(self):
         """Test that the versionbits warning has been written to the alert file."""
-        alert_text = open(self.alert_filename, 'r', encoding='utf8').read()
-        return VB_PATTERN.search(alert_text) is not None
+        with open(self.alert_filename, 'r', encoding='utf8') as f:
+            return any(VB_PATTERN.search(line) for line in f)
 
     def run_test(self):
         node = self.nodes[0]
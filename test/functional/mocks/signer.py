@@ -8,6 +8,23 @@ import sys
 import argparse
 import json
 
+ENUMERATE_JSON = json.dumps([{"fingerprint": "00000001", "type": "trezor", "model": "trezor_t"}, {"fingerprint": "00000002"}]).encode()
+
+XPUB = b"tpubD6NzVbkrYhZ4WaWSyoBvQwbpLkojyoTZPRsgXELWz3Popb3qkjcJyJUGLnL4qHHoQvao8ESaAstxYSnhyswJ76uZPStJRJCTKvosUCJZL5B"
+
+# getdescriptors response, pre-serialized with the account left as a placeholder
+GETDESCRIPTORS_TEMPLATE = (
+    b'{"receive": ['
+    b'"pkh([00000001/44\'/1\'/%(account)s\']' + XPUB + b'/0/*)#vt6w3l3j", '
+    b'"sh(wpkh([00000001/49\'/1\'/%(account)s\']' + XPUB + b'/0/*))#r0grqw5x", '
+    b'"wpkh([00000001/84\'/1\'/%(account)s\']' + XPUB + b'/0/*)#x30uthjs"'
+    b'], "internal": ['
+    b'"pkh([00000001/44\'/1\'/%(account)s\']' + XPUB + b'/1/*)#all0v2p2", '
+    b'"sh(wpkh([00000001/49\'/1\'/%(account)s\']' + XPUB + b'/1/*))#kwx4c3pe", '
+    b'"wpkh([00000001/84\'/1\'/%(account)s\']' + XPUB + b'/1/*)#h92akzzg"'
+    b']}'
+)
+
 def perform_pre_checks():
     mock_result_path = os.path.join(os.getcwd(), "mock_result")
     if(os.path.isfile(mock_result_path)):
@@ -18,23 +35,10 @@ def perform_pre_checks():
             sys.exit(int(mock_result[0]))
 
 def enumerate(args):
-    sys.stdout.write(json.dumps([{"fingerprint": "00000001", "type": "trezor", "model": "trezor_t"}, {"fingerprint": "00000002"}]))
+    sys.stdout.buffer.write(ENUMERATE_JSON)
 
 def getdescriptors(args):
-    xpub = "tpubD6NzVbkrYhZ4WaWSyoBvQwbpLkojyoTZPRsgXELWz3Popb3qkjcJyJUGLnL4qHHoQvao8ESaAstxYSnhyswJ76uZPStJRJCTKvosUCJZL5B"
-
-    sys.stdout.write(json.dumps({
-        "receive": [
-            "pkh([00000001/44'/1'/" + args.account + "']" + xpub + "/0/*)#vt6w3l3j",
-            "sh(wpkh([00000001/49'/1'/" + args.account + "']" + xpub + "/0/*))#r0grqw5x",
-            "wpkh([00000001/84'/1'/" + args.account + "']" + xpub + "/0/*)#x30uthjs"
-        ],
-        "internal": [
-            "pkh([00000001/44'/1'/" + args.account + "']" + xpub + "/1/*)#all0v2p2",
-            "sh(wpkh([00000001/49'/1'/" + args.account + "']" + xpub + "/1/*))#kwx4c3pe",
-            "wpkh([00000001/84'/1'/" + args.account + "']" + xpub + "/1/*)#h92akzzg"
-        ]
-    }))
+    sys.stdout.buffer.write(GETDESCRIPTORS_TEMPLATE % {b"account": args.account.encode()})
 
 
 def displayaddress(args):
@@ -66,37 +70,45 @@ def signtx(args):
     else:
         sys.stdout.write(json.dumps({"psbt": args.psbt}))
 
-parser = argparse.ArgumentParser(prog='./signer.py', description='External signer mock')
-parser.add_argument('--fingerprint')
-parser.add_argument('--chain', default='main')
-parser.add_argument('--stdin', action='store_true')
+if __name__ == '__main__':
+    # bitcoind calls "<command> enumerate" without any other arguments; answer
+    # that directly instead of building the full argparse parser.
+    if sys.argv[1:] == ['enumerate']:
+        perform_pre_checks()
+        enumerate(None)
+        sys.exit()
+
+    parser = argparse.ArgumentParser(prog='./signer.py', description='External signer mock')
+    parser.add_argument('--fingerprint')
+    parser.add_argument('--chain', default='main')
+    parser.add_argument('--stdin', action='store_true')
 
-subparsers = parser.add_subparsers(description='Commands', dest='command')
-subparsers.required = True
+    subparsers = parser.add_subparsers(description='Commands', dest='command')
+    subparsers.required = True
 
-parser_enumerate = subparsers.add_parser('enumerate', help='list available signers')
-parser_enumerate.set_defaults(func=enumerate)
+    parser_enumerate = subparsers.add_parser('enumerate', help='list available signers')
+    parser_enumerate.set_defaults(func=enumerate)
 
-parser_getdescriptors = subparsers.add_parser('getdescriptors')
-parser_getdescriptors.set_defaults(func=getdescriptors)
-parser_getdescriptors.add_argument('--account', metavar='account')
+    parser_getdescriptors = subparsers.add_parser('getdescriptors')
+    parser_getdescriptors.set_defaults(func=getdescriptors)
+    parser_getdescriptors.add_argument('--account', metavar='account')
 
-parser_displayaddress = subparsers.add_parser('displayaddress', help='display address on signer')
-parser_displayaddress.add_argument('--desc', metavar='desc')
-parser_displayaddress.set_defaults(func=displayaddress)
+    parser_displayaddress = subparsers.add_parser('displayaddress', help='display address on signer')
+    parser_displayaddress.add_argument('--desc', metavar='desc')
+    parser_displayaddress.set_defaults(func=displayaddress)
 
-parser_signtx = subparsers.add_parser('signtx')
-parser_signtx.add_argument('psbt', metavar='psbt')
+    parser_signtx = subparsers.add_parser('signtx')
+    parser_signtx.add_argument('psbt', metavar='psbt')
 
-parser_signtx.set_defaults(func=signtx)
+    parser_signtx.set_defaults(func=signtx)
 
-if not sys.stdin.isatty():
-    buffer = sys.stdin.read()
-    if buffer and buffer.rstrip() != "":
-        sys.argv.extend(buffer.rstrip().split(" "))
+    if not sys.stdin.isatty():
+        buffer = sys.stdin.read()
+        if buffer and buffer.rstrip() != "":
+            sys.argv.extend(buffer.rstrip().split(" "))
 
-args = parser.parse_args()
+    args = parser.parse_args()
 
-perform_pre_checks()
+    perform_pre_checks()
 
-args.func(args)
+    args.func(args)
@@ -4,7 +4,10 @@
 # file COPYING or http://www.opensource.org/licenses/mit-license.php.
 """Test processing of feefilter messages."""
 
+from collections import Counter
 from decimal import Decimal
+import threading
+import time
 
 from test_framework.blocktools import COINBASE_MATURITY
 from test_framework.messages import MSG_TX, MSG_WTX, msg_feefilter
@@ -28,16 +31,40 @@ class FeefilterConn(P2PInterface):
 class TestP2PConn(P2PInterface):
     def __init__(self):
         super().__init__()
+        # Raw inv hashes; converted to hex only when reporting a mismatch
         self.txinvs = []
+        # Notified (with p2p_lock held) whenever txinvs grows or the connection closes
+        self.txinvs_changed = threading.Condition(p2p_lock)
 
     def on_inv(self, message):
         for i in message.inv:
             if (i.type == MSG_TX) or (i.type == MSG_WTX):
-                self.txinvs.append('{:064x}'.format(i.hash))
+                self.txinvs.append(i.hash)
+        self.txinvs_changed.notify_all()
 
-    def wait_for_invs_to_match(self, invs_expected):
-        invs_expected.sort()
-        self.wait_until(lambda: invs_expected == sorted(self.txinvs))
+    def on_close(self):
+        super().on_close()
+        # Wake up wait_for_invs_to_match so it notices the disconnect
+        with p2p_lock:
+            self.txinvs_changed.notify_all()
+
+    def wait_for_invs_to_match(self, invs_expected, timeout=60):
+        """Block until the received tx invs match invs_expected.
+
+        Rather than polling, wake up only when on_inv delivers new invs or the
+        connection closes."""
+        invs_expected = Counter(int(inv, 16) for inv in invs_expected)
+        timeout *= self.timeout_factor
+        time_end = time.time() + timeout
+        with p2p_lock:
+            while invs_expected != Counter(self.txinvs):
+                assert self.is_connected
+                remaining = time_end - time.time()
+                if remaining <= 0:
+                    raise AssertionError("Expected invs {} not received after {} seconds, got {}".format(
+                        sorted('{:064x}'.format(h) for h in invs_expected.elements()), timeout,
+                        sorted('{:064x}'.format(h) for h in self.txinvs)))
+                self.txinvs_changed.wait(remaining)
 
     def clear_invs(self):
         with p2p_lock:
@@ -682,8 +682,9 @@ class CBlockHeader:
             r += struct.pack("<I", self.nTime)
             r += struct.pack("<I", self.nBits)
             r += struct.pack("<I", self.nNonce)
-            self.sha256 = uint256_from_str(hash256(r))
-            self.hash = hash256(r)[::-1].hex()
+            h = hash256(r)
+            self.sha256 = uint256_from_str(h)
+            self.hash = h[::-1].hex()
 
     def rehash(self):
         self.sha256 = None
@@ -762,8 +763,14 @@ class CBlock(CBlockHeader):
     def solve(self):
         self.rehash()
         target = uint256_from_compact(self.nBits)
-        while self.sha256 > target:
-            self.nNonce += 1
+        if self.sha256 > target:
+            # Only the nonce changes between attempts, so serialize the rest
+            # of the header once and hash it with each candidate nonce.
+            header_prefix = CBlockHeader.serialize(self)[:-4]
+            nonce = self.nNonce + 1
+            while int.from_bytes(hash256(header_prefix + struct.pack("<I", nonce)), 'little') > target:
+                nonce += 1
+            self.nNonce = nonce
             self.rehash()
 
     # Calculate the block weight using witness and non-witness
@@ -265,6 +265,17 @@ class P2PConnection(asyncio.Protocol):
         self._log_message("send", message)
         return self.send_raw_message(tmsg)
 
+    def send_messages(self, messages):
+        """Send multiple P2P messages over the socket with a single write.
+
+        The serialized messages are concatenated and handed to the transport
+        at once, instead of scheduling one write per message."""
+        tmsgs = []
+        for message in messages:
+            tmsgs.append(self.build_message(message))
+            self._log_message("send", message)
+        return self.send_raw_message(b"".join(tmsgs))
+
     def send_raw_message(self, raw_message_bytes):
         if not self.is_connected:
             raise IOError('Not connected')
@@ -8,10 +8,12 @@
 from concurrent.futures import ThreadPoolExecutor, as_completed
 import argparse
 import configparser
+import json
 import logging
 import os
 import subprocess
 import sys
+import tempfile
 
 
 def get_fuzz_env(*, target, source_dir):
@@ -50,7 +52,7 @@ def main():
         '--par',
         '-j',
         type=int,
-        default=4,
+        default=os.cpu_count() or 1,
         help='How many targets to merge or execute in parallel.',
     )
     parser.add_argument(
@@ -66,6 +68,12 @@ def main():
         '--m_dir',
         help='Merge inputs from this directory into the corpus_dir.',
     )
+    parser.add_argument(
+        '--no-cache',
+        dest='use_cache',
+        action='store_false',
+        help='Do not read or write the on-disk cache of results derived from the fuzz binary.',
+    )
     parser.add_argument(
         '-g',
         '--generate',
@@ -92,8 +100,10 @@ def main():
         logging.error("Must have fuzz targets built")
         sys.exit(1)
 
+    fuzz_bin = os.path.join(config["environment"]["BUILDDIR"], 'src', 'test', 'fuzz', 'fuzz')
+
     # Build list of tests
-    test_list_all = parse_test_list(fuzz_bin=os.path.join(config["environment"]["BUILDDIR"], 'src', 'test', 'fuzz', 'fuzz'))
+    test_list_all = parse_test_list(fuzz_bin=fuzz_bin, use_cache=args.use_cache)
 
     if not test_list_all:
         logging.error("No fuzz targets found")
@@ -102,29 +112,35 @@ def main():
     logging.debug("{} fuzz target(s) found: {}".format(len(test_list_all), " ".join(sorted(test_list_all))))
 
     args.target = args.target or test_list_all  # By default run all
-    test_list_error = list(set(args.target).difference(set(test_list_all)))
+    all_targets = frozenset(test_list_all)
+    requested_targets = frozenset(args.target)
+    test_list_error = list(requested_targets - all_targets)
     if test_list_error:
         logging.error("Unknown fuzz targets selected: {}".format(test_list_error))
-    test_list_selection = list(set(test_list_all).intersection(set(args.target)))
-    if not test_list_selection:
+    selection = set(all_targets & requested_targets)
+    if not selection:
         logging.error("No fuzz targets selected")
     if args.exclude:
-        for excluded_target in args.exclude.split(","):
-            if excluded_target not in test_list_selection:
+        excluded_targets = args.exclude.split(",")
+        for excluded_target in excluded_targets:
+            if excluded_target not in selection:
                 logging.error("Target \"{}\" not found in current target list.".format(excluded_target))
-                continue
-            test_list_selection.remove(excluded_target)
-    test_list_selection.sort()
+        selection.difference_update(excluded_targets)
+    test_list_selection = sorted(selection)
 
     logging.info("{} of {} detected fuzz target(s) selected: {}".format(len(test_list_selection), len(test_list_all), " ".join(test_list_selection)))
 
     if not args.generate:
-        test_list_missing_corpus = []
-        for t in test_list_selection:
-            corpus_path = os.path.join(args.corpus_dir, t)
-            if not os.path.exists(corpus_path) or len(os.listdir(corpus_path)) == 0:
-                test_list_missing_corpus.append(t)
-        test_list_missing_corpus.sort()
+        # Scan the corpus dir once rather than probing each target's
+        # subdirectory, and only open the subdirectories of selected targets
+        has_corpus = {}
+        if os.path.isdir(args.corpus_dir):
+            with os.scandir(args.corpus_dir) as corpus_entries:
+                for entry in corpus_entries:
+                    if entry.name in selection and entry.is_dir():
+                        with os.scandir(entry.path) as inputs:
+                            has_corpus[entry.name] = any(True for _ in inputs)
+        test_list_missing_corpus = [t for t in test_list_selection if not has_corpus.get(t, False)]
         if test_list_missing_corpus:
             logging.info(
                 "Fuzzing harnesses lacking a corpus: {}".format(
@@ -133,10 +149,10 @@ def main():
             )
             logging.info("Please consider adding a fuzz corpus at https://github.com/bitcoin-core/qa-assets")
 
-    try:
+    def probe_libfuzzer():
         help_output = subprocess.run(
             args=[
-                os.path.join(config["environment"]["BUILDDIR"], 'src', 'test', 'fuzz', 'fuzz'),
+                fuzz_bin,
                 '-help=1',
             ],
             env=get_fuzz_env(target=test_list_selection[0], source_dir=config['environment']['SRCDIR']),
@@ -145,7 +161,10 @@ def main():
             stderr=subprocess.PIPE,
             universal_newlines=True,
         ).stderr
-        if "libFuzzer" not in help_output:
+        return "libFuzzer" in help_output
+
+    try:
+        if not cached_for_file(cache_name='libfuzzer_probe.json', file_path=fuzz_bin, compute=probe_libfuzzer, use_cache=args.use_cache):
             logging.error("Must be built with libFuzzer")
             sys.exit(1)
     except subprocess.TimeoutExpired:
@@ -247,8 +266,11 @@ def merge_inputs(*, fuzz_pool, corpus, test_list, src_dir, build_dir, merge_dir)
 
         jobs.append(fuzz_pool.submit(job, t, args))
 
-    for future in as_completed(jobs):
-        future.result()
+    # Let all merges settle before surfacing the first failure
+    errors = [future.exception() for future in as_completed(jobs)]
+    for e in errors:
+        if e is not None:
+            raise e
 
 
 def run_once(*, fuzz_pool, corpus, test_list, src_dir, build_dir, use_valgrind):
@@ -277,6 +299,7 @@ def run_once(*, fuzz_pool, corpus, test_list, src_dir, build_dir, use_valgrind):
 
         jobs.append(fuzz_pool.submit(job, t, args))
 
+    failed = False
     for future in as_completed(jobs):
         output, result = future.result()
         logging.debug(output)
@@ -288,20 +311,68 @@ def run_once(*, fuzz_pool, corpus, test_list, src_dir, build_dir, use_valgrind):
             if e.stderr:
                 logging.info(e.stderr)
             logging.info("Target \"{}\" failed with exit code {}".format(" ".join(result.args), e.returncode))
-            sys.exit(1)
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+def cached_for_file(*, cache_name, file_path, compute, use_cache=True, should_cache=lambda value: True):
+    """Return compute(), memoized on disk for as long as file_path is unchanged.
+
+    Results are stored in a JSON file under the user cache directory, keyed
+    on the path, mtime and size of file_path. The cache file is replaced
+    atomically, so concurrent runs never observe a partial write. Values for
+    which should_cache returns False are returned but not stored.
+    """
+    if not use_cache:
+        return compute()
 
+    cache_home = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    cache_path = os.path.join(cache_home, 'bitcoin-fuzz', cache_name)
+    st = os.stat(file_path)
+    key = [st.st_mtime_ns, st.st_size]
+    file_path = os.path.abspath(file_path)
+
+    try:
+        with open(cache_path, encoding='utf8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    if not isinstance(cache, dict):
+        cache = {}
+    entry = cache.get(file_path)
+    if isinstance(entry, dict) and entry.get('key') == key and 'value' in entry:
+        return entry['value']
+
+    value = compute()
+    if not should_cache(value):
+        return value
+    cache[file_path] = {'key': key, 'value': value}
+    try:
+        os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+        with tempfile.NamedTemporaryFile('w', encoding='utf8', dir=os.path.dirname(cache_path), delete=False) as f:
+            json.dump(cache, f)
+        os.replace(f.name, cache_path)
+    except OSError as e:
+        logging.debug("Could not write cache {}: {}".format(cache_path, e))
+    return value
+
+
+def parse_test_list(*, fuzz_bin, use_cache=True):
+    def compute():
+        return subprocess.run(
+            fuzz_bin,
+            env={
+                'PRINT_ALL_FUZZ_TARGETS_AND_ABORT': ''
+            },
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            universal_newlines=True,
+        ).stdout.splitlines()
 
-def parse_test_list(*, fuzz_bin):
-    test_list_all = subprocess.run(
-        fuzz_bin,
-        env={
-            'PRINT_ALL_FUZZ_TARGETS_AND_ABORT': ''
-        },
-        stdout=subprocess.PIPE,
-        stderr=subprocess.DEVNULL,
-        universal_newlines=True,
-    ).stdout.splitlines()
-    return test_list_all
+    # An empty list most likely means the binary failed to start (e.g. missing
+    # shared libraries), so don't let it stick in the cache.
+    return cached_for_file(cache_name='test_list.json', file_path=fuzz_bin, compute=compute, use_cache=use_cache, should_cache=bool)
 
 
 if __name__ == '__main__':